@@ -0,0 +1,337 @@
+"""
+NER pre-pass for free-text documents before Stage 2 LLM extraction.
+
+Unstructured text and court documents are run through spaCy
+(uk_core_news_sm) in batches. Only the sentence windows around named
+entities (PER/ORG/LOC), RNOKPP/EDRPOU-like numbers and dates are kept, so
+the LLM receives compact excerpts instead of whole documents. spaCy output
+is cached on disk per document hash. Texts longer than `nlp.max_length`
+are split into chunks on line boundaries.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from bisect import bisect_right
+from collections import defaultdict
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import spacy
+from loguru import logger
+from pydantic import BaseModel, Field
+
+
+DEFAULT_MODEL = "uk_core_news_sm"
+DEFAULT_CACHE_DIR = Path("data/cache/ner")
+
+# Entity labels worth keeping for Stage 2 (uk_core_news_sm also emits MISC)
+KEEP_LABELS = frozenset({"PER", "ORG", "LOC"})
+
+# Components not needed for NER + sentence boundaries
+DISABLED_PIPES = ("morphologizer", "parser", "attribute_ruler", "lemmatizer")
+
+EXCERPT_SEPARATOR = "\n[...]\n"
+
+# RNOKPP is 10 digits, EDRPOU is 8 digits
+RNOKPP_PATTERN = re.compile(r"(?<!\d)\d{10}(?!\d)")
+EDRPOU_PATTERN = re.compile(r"(?<!\d)\d{8}(?!\d)")
+DATE_PATTERN = re.compile(
+    r"(?<!\d)(?:"
+    r"\d{1,2}[./-]\d{1,2}[./-](?:\d{4}|\d{2})"  # 24.08.1991, 24/08/91
+    r"|\d{4}-\d{2}-\d{2}"  # 1991-08-24
+    r"|\d{1,2}\s+(?:січня|лютого|березня|квітня|травня|червня|липня|"
+    r"серпня|вересня|жовтня|листопада|грудня)\s+\d{4}"  # 24 серпня 1991
+    r")(?!\d)",
+    re.IGNORECASE,
+)
+PATTERNS: Dict[str, re.Pattern] = {
+    "RNOKPP": RNOKPP_PATTERN,
+    "EDRPOU": EDRPOU_PATTERN,
+    "DATE": DATE_PATTERN,
+}
+
+
+class EntityMention(BaseModel):
+    """Entity or pattern match with character offsets in the source text."""
+    label: str = Field(description="Label (PER, ORG, LOC, RNOKPP, EDRPOU, DATE)")
+    text: str = Field(description="Matched text")
+    start: int = Field(description="Start character offset")
+    end: int = Field(description="End character offset")
+
+
+class DocumentAnnotations(BaseModel):
+    """Cached spaCy output for a single document."""
+    doc_hash: str = Field(description="SHA-256 of model name, model version and document text")
+    sentences: List[Tuple[int, int]] = Field(default_factory=list, description="Sentence (start, end) offsets")
+    entities: List[EntityMention] = Field(default_factory=list, description="All named entities found by spaCy")
+
+
+def split_text(text: str, max_length: int) -> List[Tuple[int, str]]:
+    """
+    Split text into chunks of at most `max_length` characters.
+
+    Chunks end on a newline where possible, then on a space, and are hard
+    cut otherwise. Returns (offset, chunk) pairs covering the whole text.
+    """
+    chunks = []
+    start = 0
+    while len(text) - start > max_length:
+        end = start + max_length
+        cut = text.rfind("\n", start + 1, end)
+        if cut == -1:
+            cut = text.rfind(" ", start + 1, end)
+        cut = end if cut == -1 else cut + 1
+        chunks.append((start, text[start:cut]))
+        start = cut
+    chunks.append((start, text[start:]))
+    return chunks
+
+
+def model_package_version(model_name: str) -> str:
+    """Get the installed package version of a spaCy model without loading it."""
+    try:
+        return version(model_name)
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def find_pattern_mentions(text: str) -> List[EntityMention]:
+    """Find RNOKPP/EDRPOU-like numbers and dates with regex."""
+    mentions = []
+    for label, pattern in PATTERNS.items():
+        for match in pattern.finditer(text):
+            mentions.append(
+                EntityMention(label=label, text=match.group(), start=match.start(), end=match.end())
+            )
+    return mentions
+
+
+def select_sentence_windows(
+    sentences: Sequence[Tuple[int, int]],
+    mentions: Sequence[EntityMention],
+    window: int = 1,
+) -> List[Tuple[int, int]]:
+    """
+    Select sentence ranges around mentions.
+
+    Returns merged (first, last) sentence index ranges, inclusive, covering
+    every sentence with a mention plus `window` sentences on each side.
+    """
+    if not sentences or not mentions:
+        return []
+
+    starts = [start for start, _ in sentences]
+    hits = set()
+    for mention in mentions:
+        index = max(bisect_right(starts, mention.start) - 1, 0)
+        hits.add(index)
+
+    ranges: List[Tuple[int, int]] = []
+    for index in sorted(hits):
+        first = max(index - window, 0)
+        last = min(index + window, len(sentences) - 1)
+        if ranges and first <= ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], last))
+        else:
+            ranges.append((first, last))
+    return ranges
+
+
+class NerPrefilter:
+    """
+    Shrink free-text documents to entity-bearing excerpts.
+
+    Documents are processed with `nlp.pipe` in batches (optionally across
+    several processes) with unused pipeline components disabled. spaCy
+    output is cached as JSON per document hash, so re-runs only process
+    new texts.
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL,
+        cache_dir: Optional[Path] = DEFAULT_CACHE_DIR,
+        batch_size: int = 64,
+        n_process: int = 1,
+        window: int = 1,
+        min_chars: int = 2000,
+    ):
+        """
+        Args:
+            model_name: spaCy model to load
+            cache_dir: Directory for cached annotations (None disables caching)
+            batch_size: Documents per `nlp.pipe` batch
+            n_process: Worker processes for `nlp.pipe`
+            window: Neighbouring sentences kept on each side of a mention
+            min_chars: Texts shorter than this are passed through unchanged
+        """
+        self.model_name = model_name
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.window = window
+        self.min_chars = min_chars
+        self.model_version = model_package_version(model_name)
+        self._nlp = None
+
+    @property
+    def nlp(self):
+        """Lazily load the spaCy pipeline with unused components disabled."""
+        if self._nlp is None:
+            nlp = spacy.load(self.model_name, disable=list(DISABLED_PIPES))
+            if "senter" in nlp.component_names:
+                nlp.enable_pipe("senter")
+            else:
+                nlp.add_pipe("sentencizer")
+            logger.info(f"Loaded {self.model_name} with pipes: {nlp.pipe_names}")
+            self._nlp = nlp
+        return self._nlp
+
+    def document_hash(self, text: str) -> str:
+        """Hash a document together with the model name and installed version."""
+        key = f"{self.model_name}\0{self.model_version}\0{text}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _cache_path(self, doc_hash: str) -> Optional[Path]:
+        if self.cache_dir is None:
+            return None
+        return self.cache_dir / f"{doc_hash}.json"
+
+    def _load_cached(self, doc_hash: str) -> Optional[DocumentAnnotations]:
+        path = self._cache_path(doc_hash)
+        if path is None or not path.exists():
+            return None
+        try:
+            return DocumentAnnotations.model_validate_json(path.read_bytes())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable NER cache entry {path}: {e}")
+            return None
+
+    def _save_cached(self, annotations: DocumentAnnotations) -> None:
+        path = self._cache_path(annotations.doc_hash)
+        if path is None:
+            return
+        tmp_path = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            tmp_path = Path(tmp_name)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(annotations.model_dump_json())
+            tmp_path.replace(path)
+        except OSError as e:
+            logger.warning(f"Failed to write NER cache entry {path}: {e}")
+            if tmp_path is not None:
+                tmp_path.unlink(missing_ok=True)
+
+    def annotate(self, texts: Sequence[str]) -> List[DocumentAnnotations]:
+        """
+        Annotate documents, running spaCy only on texts not in the cache.
+
+        Args:
+            texts: Document texts
+
+        Returns:
+            Annotations in the same order as `texts`
+        """
+        hashes = [self.document_hash(text) for text in texts]
+        results: Dict[str, DocumentAnnotations] = {}
+        pending: Dict[str, str] = {}
+
+        for doc_hash, text in zip(hashes, texts):
+            if doc_hash in results or doc_hash in pending:
+                continue
+            cached = self._load_cached(doc_hash)
+            if cached is not None:
+                results[doc_hash] = cached
+            else:
+                pending[doc_hash] = text
+
+        if pending:
+            logger.info(f"Running NER on {len(pending)} documents ({len(results)} cached)")
+            chunks = [
+                (doc_hash, offset, chunk)
+                for doc_hash, text in pending.items()
+                for offset, chunk in split_text(text, self.nlp.max_length)
+            ]
+            docs = self.nlp.pipe(
+                (chunk for _, _, chunk in chunks), batch_size=self.batch_size, n_process=self.n_process
+            )
+            sentences: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+            entities: Dict[str, List[EntityMention]] = defaultdict(list)
+            for (doc_hash, offset, _), doc in zip(chunks, docs):
+                sentences[doc_hash].extend(
+                    (offset + sent.start_char, offset + sent.end_char) for sent in doc.sents
+                )
+                entities[doc_hash].extend(
+                    EntityMention(
+                        label=ent.label_, text=ent.text,
+                        start=offset + ent.start_char, end=offset + ent.end_char,
+                    )
+                    for ent in doc.ents
+                )
+
+            for doc_hash in pending:
+                annotations = DocumentAnnotations(
+                    doc_hash=doc_hash, sentences=sentences[doc_hash], entities=entities[doc_hash]
+                )
+                self._save_cached(annotations)
+                results[doc_hash] = annotations
+
+        return [results[doc_hash] for doc_hash in hashes]
+
+    def build_excerpt(self, text: str, annotations: DocumentAnnotations) -> str:
+        """
+        Join the sentence windows around mentions into a single excerpt.
+
+        If no window is selected, the original text is returned so a missed
+        NER hit does not drop the document from Stage 2.
+        """
+        mentions = [entity for entity in annotations.entities if entity.label in KEEP_LABELS]
+        mentions.extend(find_pattern_mentions(text))
+        ranges = select_sentence_windows(annotations.sentences, mentions, self.window)
+        if not ranges:
+            logger.warning(
+                f"No entities found in document {annotations.doc_hash[:12]}, keeping full text"
+            )
+            return text
+
+        parts = []
+        for first, last in ranges:
+            start = annotations.sentences[first][0]
+            end = annotations.sentences[last][1]
+            parts.append(text[start:end].strip())
+        return EXCERPT_SEPARATOR.join(part for part in parts if part)
+
+    def compress(self, texts: Sequence[str]) -> List[str]:
+        """
+        Reduce documents to entity-bearing excerpts for Stage 2.
+
+        Texts shorter than `min_chars` and documents without any mentions
+        are returned unchanged.
+
+        Args:
+            texts: Document texts
+
+        Returns:
+            Excerpts in the same order as `texts`
+        """
+        excerpts = list(texts)
+        long_indices = [i for i, text in enumerate(texts) if len(text) >= self.min_chars]
+        if not long_indices:
+            return excerpts
+
+        long_texts = [texts[i] for i in long_indices]
+        for i, text, annotations in zip(long_indices, long_texts, self.annotate(long_texts)):
+            excerpts[i] = self.build_excerpt(text, annotations)
+
+        original = sum(len(texts[i]) for i in long_indices)
+        reduced = sum(len(excerpts[i]) for i in long_indices)
+        logger.info(
+            f"NER pre-pass reduced {len(long_indices)} documents "
+            f"from {original} to {reduced} characters"
+        )
+        return excerpts
@@ -0,0 +1,252 @@
+"""
+Test NER pre-pass used to shrink free-text documents before Stage 2.
+"""
+
+import json
+import tempfile
+from pathlib import Path
+
+import spacy
+
+from src.extractors.ner_prefilter import (
+    EXCERPT_SEPARATOR,
+    DocumentAnnotations,
+    EntityMention,
+    NerPrefilter,
+    find_pattern_mentions,
+    select_sentence_windows,
+    split_text,
+)
+
+
+def blank_pipeline():
+    """Build a small Ukrainian pipeline that emits PER and MISC entities."""
+    nlp = spacy.blank("uk")
+    nlp.add_pipe("sentencizer")
+    ruler = nlp.add_pipe("entity_ruler")
+    ruler.add_patterns([
+        {"label": "PER", "pattern": "Петренко"},
+        {"label": "MISC", "pattern": "Конституція"},
+    ])
+    return nlp
+
+
+def count_pipe_calls(nlp):
+    """Wrap `nlp.pipe` to count how many documents it processes."""
+    calls = []
+    pipe = nlp.pipe
+
+    def counting_pipe(texts, **kwargs):
+        texts = list(texts)
+        calls.extend(texts)
+        return pipe(texts, **kwargs)
+
+    nlp.pipe = counting_pipe
+    return calls
+
+
+def sentence_offsets(sentences):
+    """Build text and (start, end) offsets from a list of sentences."""
+    offsets = []
+    position = 0
+    for sentence in sentences:
+        offsets.append((position, position + len(sentence)))
+        position += len(sentence) + 1
+    return " ".join(sentences), offsets
+
+
+def test_find_pattern_mentions():
+    """Test RNOKPP, EDRPOU and date detection."""
+    text = "РНОКПП 3347367890, ЄДРПОУ 12345678, народився 24.08.1991 або 24 серпня 1991, сума 123456789."
+    mentions = find_pattern_mentions(text)
+    found = {(mention.label, mention.text) for mention in mentions}
+
+    assert ("RNOKPP", "3347367890") in found
+    assert ("EDRPOU", "12345678") in found
+    assert ("DATE", "24.08.1991") in found
+    assert ("DATE", "24 серпня 1991") in found
+    assert not any(mention.text == "123456789" for mention in mentions)
+
+    print("✓ Pattern mentions test passed")
+
+
+def test_select_sentence_windows():
+    """Test sentence window selection and merging."""
+    sentences = [(i * 10, i * 10 + 9) for i in range(10)]
+    mentions = [
+        EntityMention(label="PER", text="x", start=21, end=22),
+        EntityMention(label="ORG", text="y", start=41, end=42),
+        EntityMention(label="DATE", text="z", start=90, end=91),
+    ]
+
+    assert select_sentence_windows(sentences, mentions, window=1) == [(1, 5), (8, 9)]
+    assert select_sentence_windows(sentences, mentions, window=0) == [(2, 2), (4, 4), (9, 9)]
+    assert select_sentence_windows(sentences, [], window=1) == []
+
+    print("✓ Sentence windows test passed")
+
+
+def test_compress_uses_cached_annotations():
+    """Test excerpt building from cached spaCy output without loading the model."""
+    text, offsets = sentence_offsets([
+        "Вступна частина без сутностей.",
+        "Ще одне речення про процедуру.",
+        "Петренко Іван Іванович працює у ТОВ Ромашка.",
+        "Наступне речення для контексту.",
+        "Далі йде довгий опис обставин.",
+        "Ще один загальний абзац.",
+        "Код ЄДРПОУ 12345678 вказано в договорі.",
+    ])
+    with tempfile.TemporaryDirectory() as cache_dir:
+        prefilter = NerPrefilter(cache_dir=Path(cache_dir), window=0, min_chars=0)
+        doc_hash = prefilter.document_hash(text)
+        person_start = text.index("Петренко")
+        prefilter._save_cached(DocumentAnnotations(
+            doc_hash=doc_hash,
+            sentences=offsets,
+            entities=[
+                EntityMention(label="PER", text="Петренко Іван Іванович", start=person_start, end=person_start + 22),
+            ],
+        ))
+
+        excerpt = prefilter.compress([text])[0]
+
+    assert prefilter._nlp is None
+    assert excerpt == EXCERPT_SEPARATOR.join([
+        "Петренко Іван Іванович працює у ТОВ Ромашка.",
+        "Код ЄДРПОУ 12345678 вказано в договорі.",
+    ])
+
+    print("✓ Cached compress test passed")
+
+
+def test_split_text():
+    """Test splitting on line boundaries with offsets covering the text."""
+    text = "перший рядок\nдругий рядок\nтретій"
+    chunks = split_text(text, 15)
+
+    assert chunks == [(0, "перший рядок\n"), (13, "другий рядок\n"), (26, "третій")]
+    assert "".join(chunk for _, chunk in chunks) == text
+    assert split_text("a" * 25, 10) == [(0, "a" * 10), (10, "a" * 10), (20, "a" * 5)]
+
+    print("✓ Split text test passed")
+
+
+def test_annotate_runs_pipeline_and_caches():
+    """Test nlp.pipe output, cache writes, deduplication and result order."""
+    long_text = "Вступ без сутностей. Петренко згадує Конституція. Кінець тексту."
+    other_text = "Інший документ. Тут Петренко знову. Останнє речення."
+    short_text = "Коротко."
+    texts = [long_text, short_text, other_text, long_text]
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        prefilter = NerPrefilter(cache_dir=Path(cache_dir), window=0, min_chars=30)
+        prefilter._nlp = blank_pipeline()
+        calls = count_pipe_calls(prefilter._nlp)
+
+        excerpts = prefilter.compress(texts)
+        annotations = prefilter.annotate([long_text])[0]
+        cache_files = sorted(Path(cache_dir).glob("*.json"))
+        cached = json.loads(cache_files[0].read_text(encoding="utf-8"))
+
+        assert len(calls) == 2
+        assert len(cache_files) == 2
+        assert {path.stem for path in cache_files} == {
+            prefilter.document_hash(long_text), prefilter.document_hash(other_text)
+        }
+        assert cached["sentences"]
+
+        calls.clear()
+        assert prefilter.compress(texts) == excerpts
+        assert calls == []
+
+    assert {entity.label for entity in annotations.entities} == {"PER", "MISC"}
+    assert excerpts == [
+        "Петренко згадує Конституція.",
+        short_text,
+        "Тут Петренко знову.",
+        "Петренко згадує Конституція.",
+    ]
+
+    print("✓ Pipeline annotate test passed")
+
+
+def test_annotate_splits_oversized_texts():
+    """Test texts longer than nlp.max_length are chunked with shifted offsets."""
+    lines = [f"Рядок номер {i} без сутностей." for i in range(20)]
+    lines[13] = "Тут згадано Петренко у рядку."
+    text = "\n".join(lines)
+
+    prefilter = NerPrefilter(cache_dir=None, window=0, min_chars=0)
+    prefilter._nlp = blank_pipeline()
+    prefilter._nlp.max_length = 100
+    calls = count_pipe_calls(prefilter._nlp)
+
+    annotations = prefilter.annotate([text])[0]
+    excerpt = prefilter.compress([text])[0]
+
+    assert len(calls) > 1
+    assert all(len(chunk) <= 100 for chunk in calls)
+    assert [(entity.label, text[entity.start:entity.end]) for entity in annotations.entities] == [
+        ("PER", "Петренко")
+    ]
+    starts = [start for start, _ in annotations.sentences]
+    assert starts == sorted(starts)
+    assert annotations.sentences[-1][1] == len(text)
+    assert excerpt == "Тут згадано Петренко у рядку."
+
+    print("✓ Oversized text test passed")
+
+
+def test_compress_keeps_text_without_mentions():
+    """Test that documents without mentions are not dropped."""
+    text = "Суд розглянув справу. Сторони подали пояснення. Рішення оголошено публічно."
+    prefilter = NerPrefilter(cache_dir=None, min_chars=0)
+    prefilter._nlp = blank_pipeline()
+
+    assert prefilter.compress([text]) == [text]
+
+    print("✓ No mentions passthrough test passed")
+
+
+def test_cache_write_failure_keeps_results():
+    """Test that a failing cache write does not lose annotations."""
+    text = "Вступ без сутностей. Петренко працював у суді. Кінець тексту."
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        blocked = Path(tmp_dir) / "blocked"
+        blocked.write_text("not a directory", encoding="utf-8")
+        prefilter = NerPrefilter(cache_dir=blocked / "ner", window=0, min_chars=0)
+        prefilter._nlp = blank_pipeline()
+
+        excerpt = prefilter.compress([text])[0]
+
+    assert excerpt == "Петренко працював у суді."
+
+    print("✓ Cache write failure test passed")
+
+
+def test_compress_passes_short_texts_through():
+    """Test that short texts are returned unchanged without running NER."""
+    prefilter = NerPrefilter(cache_dir=None, min_chars=100)
+    texts = ["Коротка довідка.", "Ще одна."]
+
+    assert prefilter.compress(texts) == texts
+    assert prefilter._nlp is None
+
+    print("✓ Short text passthrough test passed")
+
+
+if __name__ == "__main__":
+    print("\n=== Testing Extractors ===\n")
+
+    test_find_pattern_mentions()
+    test_select_sentence_windows()
+    test_compress_uses_cached_annotations()
+    test_split_text()
+    test_annotate_runs_pipeline_and_caches()
+    test_annotate_splits_oversized_texts()
+    test_compress_keeps_text_without_mentions()
+    test_cache_write_failure_keeps_results()
+    test_compress_passes_short_texts_through()
+
+    print("\n=== All tests passed! ===\n")